@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the F5-TTS benchmark scripts.
+
+Handles the F5-TTS path setup, model loading, warmup and CUDA-event timing so
+every script measures inference the same way.
+
+Usage (from another script in scripts/):
+    from _bench_common import enable_fast_matmul, load_model, warmup, bench, print_summary
+
+    enable_fast_matmul()
+"""
+
+import os
+import statistics
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+# Add F5-TTS to path
+F5_TTS_SRC = Path(__file__).parent.parent / "third_party" / "F5-TTS" / "src"
+if str(F5_TTS_SRC) not in sys.path:
+    sys.path.insert(0, str(F5_TTS_SRC))
+
+# Persist Inductor artifacts in one repo-local cache, so every script that imports this
+# module reuses graphs compiled by earlier runs (e.g. warmup_model.py). Set before torch
+# is imported; Inductor also reads the cache dir lazily, so it applies either way.
+INDUCTOR_CACHE_DIR = Path(__file__).parent.parent / ".cache" / "inductor"
+os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(INDUCTOR_CACHE_DIR))
+os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+
+import torch
+import torchaudio
+from f5_tts.api import F5TTS
+from f5_tts.infer.utils_infer import (
+    hop_length,
+    infer_batch_process,
+    preprocess_ref_audio_text,
+    target_rms,
+    target_sample_rate,
+)
+from f5_tts.model.utils import convert_char_to_pinyin, list_str_to_idx
+
+
+def enable_fast_matmul():
+    """Route FP32 matmuls/convs through TF32 tensor cores and let cuDNN autotune.
+
+    Call once at script entry, before the model is constructed.
+    """
+    torch.set_float32_matmul_precision("high")
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+    torch.backends.cudnn.benchmark = True
+
+
+def print_system_info():
+    """Print the PyTorch / CUDA banner shared by all scripts"""
+    print(f"PyTorch: {torch.__version__}")
+    print(f"CUDA: {torch.cuda.is_available()}")
+    if torch.cuda.is_available():
+        print(f"CUDA device: {torch.cuda.get_device_name(0)}")
+        print(f"CUDA version: {torch.version.cuda}")
+
+
+def mixed_precision_dtype() -> torch.dtype:
+    """bfloat16 where the GPU supports it (wider range, no scaling needed), else float16"""
+    if torch.cuda.is_available() and torch.cuda.is_bf16_supported():
+        return torch.bfloat16
+    return torch.float16
+
+
+def load_model(model: str = "F5TTS_v1_Base", device: str | None = None) -> F5TTS:
+    """Return the process-wide F5TTS instance for (model, device), building it on first use.
+
+    The device is resolved before the cache lookup so load_model() and
+    load_model(device="cuda") share one instance. Scripts that import each other, or
+    are driven from one parent via `python -m`, load the weights only once.
+    """
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    return _load_model(model, device)
+
+
+@lru_cache(maxsize=None)
+def _load_model(model: str, device: str) -> F5TTS:
+    return F5TTS(model=model, device=device)
+
+
+def timed(fn, *args, **kwargs):
+    """Call fn and return (result, elapsed_seconds) measured with CUDA events.
+
+    The leading synchronize drains any kernels still queued from earlier work so they
+    are not charged to this call; the end event already waits for the stream, so no
+    trailing synchronize is needed. Falls back to perf_counter on CPU.
+    """
+    if not torch.cuda.is_available():
+        start = time.perf_counter()
+        out = fn(*args, **kwargs)
+        return out, time.perf_counter() - start
+
+    torch.cuda.synchronize()
+    start_evt = torch.cuda.Event(enable_timing=True)
+    end_evt = torch.cuda.Event(enable_timing=True)
+    start_evt.record()
+    out = fn(*args, **kwargs)
+    end_evt.record()
+    end_evt.synchronize()
+    return out, start_evt.elapsed_time(end_evt) / 1000
+
+
+def sync_infer(model: F5TTS, **kwargs):
+    """Run one model.infer() and return (result, elapsed_seconds); see timed()"""
+    return timed(model.infer, **kwargs)
+
+
+def warmup(model: F5TTS, n: int = 1, **kwargs):
+    """Run n untimed inferences, then drain the device so run 1 starts clean"""
+    for _ in range(n):
+        model.infer(**kwargs)
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+def prepare_reference(ref_file: str, ref_text: str):
+    """Preprocess and decode a reference clip once.
+
+    Returns ((audio, sr), ref_text). Passing the same tuple object to infer_prepared()
+    keeps its id stable, which is what keys _ref_audio_tensor_cache, so every call after
+    the first skips resampling and the host-to-device copy.
+    """
+    ref_file, ref_text = preprocess_ref_audio_text(ref_file, ref_text, show_info=lambda x: None)
+    return torchaudio.load(ref_file), ref_text
+
+
+@torch.inference_mode()
+def infer_prepared(model: F5TTS, ref, ref_text: str, gen_text: str, nfe_step: int = 32, **kwargs):
+    """Synthesize one text batch from a prepare_reference() result, returning (wav, sr, spec).
+
+    Skips F5TTS.infer's per-call file hashing, reference decoding and text chunking, so
+    the time measured is the sampler and vocoder. Runs under inference_mode, which also
+    covers the reference preprocessing that infer_batch_process does outside its own.
+    """
+    return next(
+        infer_batch_process(
+            ref,
+            ref_text,
+            [gen_text],
+            model.ema_model,
+            model.vocoder,
+            mel_spec_type=model.mel_spec_type,
+            progress=None,
+            nfe_step=nfe_step,
+            device=model.device,
+            skip_spectrogram=True,
+            **kwargs,
+        )
+    )
+
+
+@dataclass
+class PreparedUtterance:
+    """Sampler inputs for one (reference, text) pair, built once outside the timing loop"""
+
+    cond: torch.Tensor  # (1, samples) reference audio on device, RMS-normalized, resampled
+    text_ids: torch.Tensor  # (1, tokens) vocab ids for ref_text + gen_text
+    duration: int  # total mel frames, reference + generated
+    ref_mel_len: int  # mel frames belonging to the reference
+    ref_rms: float  # original reference RMS, restored on the output
+
+
+@torch.inference_mode()
+def prepare_utterance(model: F5TTS, ref, ref_text: str, gen_text: str, speed: float = 1.0) -> PreparedUtterance:
+    """Do infer_batch_process's per-call CPU work up front: reference normalization,
+    resampling, pinyin conversion, tokenization and duration estimation.
+    """
+    audio, sr = ref
+    if audio.shape[0] > 1:
+        audio = torch.mean(audio, dim=0, keepdim=True)
+    ref_rms = torch.sqrt(torch.mean(torch.square(audio))).item()
+    if ref_rms < target_rms:
+        audio = audio * target_rms / ref_rms
+    if sr != target_sample_rate:
+        audio = torchaudio.transforms.Resample(sr, target_sample_rate)(audio)
+    cond = audio.to(model.device)
+
+    if len(ref_text[-1].encode("utf-8")) == 1:
+        ref_text = ref_text + " "
+    if len(gen_text.encode("utf-8")) < 10:
+        speed = 0.3
+    text = convert_char_to_pinyin([ref_text + gen_text])
+    text_ids = list_str_to_idx(text, model.ema_model.vocab_char_map).to(model.device)
+
+    ref_mel_len = cond.shape[-1] // hop_length
+    ref_text_len = len(ref_text.encode("utf-8"))
+    gen_text_len = len(gen_text.encode("utf-8"))
+    duration = ref_mel_len + int(ref_mel_len / ref_text_len * gen_text_len / speed)
+
+    return PreparedUtterance(cond, text_ids, duration, ref_mel_len, ref_rms)
+
+
+def sample_mel(
+    model: F5TTS,
+    utt: PreparedUtterance,
+    nfe_step: int = 32,
+    cfg_strength: float = 2.0,
+    sway_sampling_coef: float = -1,
+    batch_size: int = 1,
+) -> torch.Tensor:
+    """Run the DiT sampler on a PreparedUtterance and return the generated mel (B, n_mels, frames)"""
+    cond, text_ids = utt.cond, utt.text_ids
+    if batch_size > 1:
+        cond = cond.repeat(batch_size, 1)
+        text_ids = text_ids.repeat(batch_size, 1)
+
+    with torch.autocast(device_type="cuda", dtype=torch.float16, enabled="cuda" in str(model.device)):
+        generated, _ = model.ema_model.sample(
+            cond=cond,
+            text=text_ids,
+            duration=utt.duration,
+            steps=nfe_step,
+            cfg_strength=cfg_strength,
+            sway_sampling_coef=sway_sampling_coef,
+        )
+
+    return generated.to(torch.float32)[:, utt.ref_mel_len :, :].permute(0, 2, 1)
+
+
+def vocode_mel(model: F5TTS, mel: torch.Tensor, utt: PreparedUtterance) -> torch.Tensor:
+    """Decode a generated mel to a waveform on device, restoring the reference RMS"""
+    if model.mel_spec_type == "vocos":
+        wave = model.vocoder.decode(mel)
+    else:
+        wave = model.vocoder(mel)
+    if utt.ref_rms < target_rms:
+        wave = wave * utt.ref_rms / target_rms
+    return wave
+
+
+@torch.inference_mode()
+def infer_tokenized(
+    model: F5TTS,
+    utt: PreparedUtterance,
+    nfe_step: int = 32,
+    cfg_strength: float = 2.0,
+    sway_sampling_coef: float = -1,
+    batch_size: int = 1,
+):
+    """Sample and vocode a PreparedUtterance, returning (wav, sr).
+
+    Mirrors the body of infer_batch_process, minus the text and reference work that
+    prepare_utterance() already did. With batch_size > 1 the utterance is repeated along
+    the batch dimension and wav has shape (batch_size, samples).
+    """
+    mel = sample_mel(model, utt, nfe_step, cfg_strength, sway_sampling_coef, batch_size)
+    wave = vocode_mel(model, mel, utt)
+    return wave.squeeze().cpu().numpy(), target_sample_rate
+
+
+@torch.inference_mode()
+def infer_overlapped(model: F5TTS, utts: list[PreparedUtterance], nfe_step: int = 32, **sample_kwargs):
+    """Synthesize utterances back to back, vocoding each on a side stream while the DiT
+    samples the next one on the default stream.
+
+    Returns (wavs, sr, times) where times[i] is the GPU time between utterance i-1 and
+    utterance i finishing (from the call start for i == 0), i.e. the steady-state
+    per-utterance cost with the vocoder hidden behind sampling.
+    """
+    vocoder_stream = torch.cuda.Stream()
+    start_evt = torch.cuda.Event(enable_timing=True)
+    done_evts = []
+    waves = []
+
+    start_evt.record()
+    for utt in utts:
+        mel = sample_mel(model, utt, nfe_step, **sample_kwargs)
+        vocoder_stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(vocoder_stream):
+            waves.append(vocode_mel(model, mel, utt))
+            done_evt = torch.cuda.Event(enable_timing=True)
+            done_evt.record()
+        # mel was allocated on the default stream but is read on the vocoder stream
+        mel.record_stream(vocoder_stream)
+        done_evts.append(done_evt)
+    torch.cuda.current_stream().wait_stream(vocoder_stream)
+    done_evts[-1].synchronize()
+
+    times = [
+        (start_evt if i == 0 else done_evts[i - 1]).elapsed_time(evt) / 1000 for i, evt in enumerate(done_evts)
+    ]
+    wavs = [wave.squeeze().cpu().numpy() for wave in waves]
+    return wavs, target_sample_rate, times
+
+
+def summarize(times: list[float], audio_duration: float) -> dict:
+    """Reduce per-run wall times to the statistics reported by the scripts"""
+    rtfs = [t / audio_duration for t in times]
+    if len(times) > 1:
+        q1, _, q3 = statistics.quantiles(times, n=4)
+    else:
+        q1 = q3 = times[0]
+    mean_rtf = statistics.mean(rtfs)
+    return {
+        "times": times,
+        "rtfs": rtfs,
+        "audio_duration": audio_duration,
+        "mean": statistics.mean(times),
+        "median": statistics.median(times),
+        "iqr": q3 - q1,
+        "rtf": mean_rtf,
+        "speedup": 1.0 / mean_rtf,
+    }
+
+
+def bench(model: F5TTS, n: int = 5, **kwargs) -> dict:
+    """Time n inferences with CUDA events and return summary statistics"""
+    times = []
+    audio_duration = 0.0
+    for _ in range(n):
+        (wav, sr, _), elapsed = sync_infer(model, **kwargs)
+        audio_duration = len(wav) / sr
+        times.append(elapsed)
+    return summarize(times, audio_duration)
+
+
+def print_summary(result: dict, label: str = ""):
+    """Print a bench() result"""
+    title = f" ({label})" if label else ""
+    print(f"Results{title}:")
+    print(f"  Audio duration: {result['audio_duration']:.3f}s")
+    print(f"  Mean: {result['mean']:.3f}s | Median: {result['median']:.3f}s | IQR: {result['iqr']:.3f}s")
+    print(f"  RTF: {result['rtf']:.3f} | Speedup: {result['speedup']:.2f}x")
+
+
+class _DiTWrapper(torch.nn.Module):
+    """Base for modules installed in place of cfm.transformer.
+
+    CFM.sample also calls transformer.clear_cache() and reads attributes such as dim,
+    so anything the wrapper does not define falls through to the wrapped DiT.
+    """
+
+    def __init__(self, module: torch.nn.Module):
+        super().__init__()
+        self.module = module
+
+    def __getattr__(self, name: str):
+        try:
+            return super().__getattr__(name)
+        except AttributeError:
+            if name == "module":
+                raise
+            return getattr(self.module, name)
+
+
+class CUDAGraphStep(_DiTWrapper):
+    """Replay a module's forward from CUDA graphs, one graph per input-shape bucket.
+
+    The DiT is called with identical shapes for every sampling step of an utterance,
+    so each step after the first becomes a single graph replay instead of dozens of
+    kernel launches. Tensor kwargs are copied into static buffers before replay;
+    non-tensor kwargs (e.g. drop_text) are part of the bucket key. The least recently
+    used graph is dropped once max_graphs buckets exist.
+
+    The text embedding stays out of the graph: TextEmbedding builds its position
+    indices on the host, which a graph cannot capture. With cache=True (as CFM.sample
+    calls it) the embedding is computed eagerly once per utterance and copied into a
+    per-graph buffer that the DiT's text cache points at.
+    """
+
+    def __init__(self, module: torch.nn.Module, max_graphs: int = 8):
+        super().__init__(module)
+        self.max_graphs = max_graphs
+        self.graphs = OrderedDict()
+        self.pool = None
+
+    @staticmethod
+    def _key(kwargs: dict) -> tuple:
+        return tuple(
+            (name, (tuple(value.shape), value.dtype) if torch.is_tensor(value) else value)
+            for name, value in sorted(kwargs.items())
+        )
+
+    @staticmethod
+    def _text_cache_attrs(kwargs: dict) -> tuple:
+        """(DiT cache attribute, drop_text) pairs this call reads"""
+        if kwargs.get("cfg_infer"):
+            return (("text_cond", False), ("text_uncond", True))
+        if kwargs.get("drop_text"):
+            return (("text_uncond", True),)
+        return (("text_cond", False),)
+
+    def _text_embeds(self, kwargs: dict) -> dict:
+        """Current text embeddings, computed eagerly where the DiT cache is empty"""
+        if not kwargs.get("cache"):
+            return {}
+        embeds = {}
+        for attr, drop_text in self._text_cache_attrs(kwargs):
+            embed = getattr(self.module, attr, None)
+            if embed is None:
+                embed = self.module.text_embed(kwargs["text"], kwargs["x"].shape[1], drop_text=drop_text)
+            embeds[attr] = embed
+        return embeds
+
+    def _capture(self, kwargs: dict, static_text: dict):
+        for attr, buf in static_text.items():
+            setattr(self.module, attr, buf)
+        static_in = {k: v.clone() if torch.is_tensor(v) else v for k, v in kwargs.items()}
+
+        # Warm up on a side stream so lazy init is not recorded into the graph
+        side = torch.cuda.Stream()
+        side.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(side):
+            for _ in range(2):
+                self.module(**static_in)
+        torch.cuda.current_stream().wait_stream(side)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph, pool=self.pool):
+            static_out = self.module(**static_in)
+        self.pool = graph.pool()
+        return graph, static_in, static_out, static_text
+
+    def forward(self, **kwargs):
+        text_embeds = self._text_embeds(kwargs)
+        key = self._key(kwargs)
+        entry = self.graphs.get(key)
+        if entry is None:
+            static_text = {attr: embed.clone() for attr, embed in text_embeds.items()}
+            entry = self._capture(kwargs, static_text)
+            self.graphs[key] = entry
+            if len(self.graphs) > self.max_graphs:
+                self.graphs.popitem(last=False)
+        else:
+            self.graphs.move_to_end(key)
+
+        graph, static_in, static_out, static_text = entry
+        # A new utterance (after clear_cache) brings fresh embeddings; later steps
+        # find the cache already pointing at this graph's buffers
+        for attr, embed in text_embeds.items():
+            if embed is not static_text[attr]:
+                static_text[attr].copy_(embed)
+                setattr(self.module, attr, static_text[attr])
+        for name, value in kwargs.items():
+            if torch.is_tensor(value):
+                static_in[name].copy_(value, non_blocking=True)
+        graph.replay()
+        # The next replay overwrites static_out (e.g. the CFG branch), so hand back a copy
+        return static_out.clone()
+
+
+def enable_cuda_graphs(model: F5TTS, max_graphs: int = 8) -> F5TTS:
+    """Swap the model's DiT for a CUDAGraphStep wrapper, running the CFM eagerly.
+
+    torch.compile(mode="reduce-overhead") already uses CUDA graphs internally, so the
+    compiled wrapper is removed to keep the two mechanisms from nesting.
+    """
+    cfm = getattr(model.ema_model, "_orig_mod", model.ema_model)
+    if not isinstance(cfm.transformer, CUDAGraphStep):
+        cfm.transformer = CUDAGraphStep(cfm.transformer, max_graphs=max_graphs)
+    model.ema_model = cfm
+    return model
+
+
+class AOTIStep(_DiTWrapper):
+    """Run the DiT forward from an AOTInductor library exported by warmup_model.py.
+
+    The library is specialized on the non-tensor kwargs of the call it was exported
+    from, with cache=False, so the text embedding is computed inside it on every step.
+    """
+
+    def __init__(self, runner, module: torch.nn.Module):
+        super().__init__(module)
+        self.runner = runner
+
+    def forward(self, **kwargs):
+        if "cache" in kwargs:
+            kwargs["cache"] = False
+        return self.runner(**kwargs)
+
+
+def enable_aoti_dit(model: F5TTS, so_path: str) -> F5TTS:
+    """Swap the model's DiT for an AOTInductor library, skipping Dynamo entirely.
+
+    The library is already compiled, so the torch.compile wrapper is removed as in
+    enable_cuda_graphs().
+    """
+    runner = torch._export.aot_load(so_path, device=str(model.device))
+    cfm = getattr(model.ema_model, "_orig_mod", model.ema_model)
+    module = cfm.transformer.module if isinstance(cfm.transformer, _DiTWrapper) else cfm.transformer
+    cfm.transformer = AOTIStep(runner, module)
+    model.ema_model = cfm
+    return model
+
+
+def quantize_dit_int8(model: F5TTS) -> F5TTS:
+    """Swap the DiT Linear weights for int8 weight-only (W8A16) with torchao.
+
+    Needs Ampere or newer for the int8 tensor-core kernels. Dynamo is reset so the
+    next inference retraces with the int8 kernels. Raises RuntimeError when the
+    device or torchao cannot support it.
+    """
+    if not torch.cuda.is_available() or torch.cuda.get_device_capability() < (8, 0):
+        raise RuntimeError("INT8 weight-only needs a CUDA device with compute capability >= 8.0")
+    try:
+        from torchao.quantization import int8_weight_only, quantize_
+    except ImportError:
+        raise RuntimeError("torchao not installed (pip install torchao)") from None
+
+    cfm = getattr(model.ema_model, "_orig_mod", model.ema_model)
+    quantize_(cfm.transformer, int8_weight_only())
+    # Drop the FP16 graphs so Dynamo retraces with the int8 kernels
+    torch._dynamo.reset()
+    return model
@@ -51,7 +51,7 @@ class RegressionDetector:
         print(f"[INFO] Max allowed RTF: {self.max_rtf:.3f} (+{self.threshold*100:.0f}%)")
 
         try:
-            from f5_tts.api import F5TTS
+            from _bench_common import load_model
         except ImportError as e:
             print(f"[ERROR] Failed to import F5TTS: {e}")
             return False
@@ -61,7 +61,7 @@ class RegressionDetector:
         print(f"[INFO] Loading model on {device}...")
 
         try:
-            tts = F5TTS(device=device)
+            tts = load_model(device=device)
         except Exception as e:
             print(f"[ERROR] Failed to load model: {e}")
             return False
@@ -6,18 +6,17 @@ Generates WAV files for NFE = [6, 7, 8] for manual listening test.
 """
 
 import time
-import torch
-import sys
-import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-# Add F5-TTS to Python path
-sys.path.insert(0, str(Path(__file__).parent.parent / "third_party" / "F5-TTS" / "src"))
+from _bench_common import load_model, sync_infer, warmup
 
-from f5_tts.api import F5TTS
+def generate_sample(model, nfe_step, output_dir, test_texts, ref_audio, ref_text, writer):
+    """Generate audio samples for a specific NFE value.
 
-def generate_sample(model, nfe_step, output_dir, test_texts, ref_audio, ref_text):
-    """Generate audio samples for a specific NFE value."""
+    WAV files are written on the `writer` executor so disk I/O overlaps the next inference;
+    returns the write futures so the caller can surface failed writes.
+    """
     output_dir = Path(output_dir)
     nfe_dir = output_dir / f"nfe_{nfe_step}"
     nfe_dir.mkdir(parents=True, exist_ok=True)
@@ -27,13 +26,12 @@ def generate_sample(model, nfe_step, output_dir, test_texts, ref_audio, ref_text
     print(f"Output directory: {nfe_dir}")
     print(f"{'='*70}")
 
+    writes = []
     for i, text in enumerate(test_texts):
         print(f"\n[{i+1}/{len(test_texts)}] Generating: \"{text[:50]}...\"")
 
-        torch.cuda.synchronize()
-        start = time.time()
-
-        wav, sr, _ = model.infer(
+        (wav, sr, _), elapsed = sync_infer(
+            model,
             ref_file=ref_audio,
             ref_text=ref_text,
             gen_text=text,
@@ -41,19 +39,18 @@ def generate_sample(model, nfe_step, output_dir, test_texts, ref_audio, ref_text
             nfe_step=nfe_step,
         )
 
-        torch.cuda.synchronize()
-        elapsed = time.time() - start
-
-        # Save audio file
+        # Save audio file in the background
         output_file = nfe_dir / f"sample_{i+1}.wav"
-        model.export_wav(wav, str(output_file))
+        writes.append(writer.submit(model.export_wav, wav, str(output_file)))
 
         audio_duration = len(wav) / sr
         rtf = elapsed / audio_duration
 
-        print(f"  Saved: {output_file.name}")
+        print(f"  Saving: {output_file.name}")
         print(f"  Time: {elapsed:.3f}s | RTF: {rtf:.3f} | Audio: {audio_duration:.2f}s")
 
+    return writes
+
 def main():
     print("="*70)
     print("Quality Comparison Sample Generator")
@@ -82,13 +79,30 @@ def main():
 
     print("\n[Init Model]")
     start = time.time()
-    model = F5TTS()
+    model = load_model()
     init_time = time.time() - start
     print(f"Init: {init_time:.2f}s")
 
-    # Generate samples for each NFE value
-    for nfe in nfe_values:
-        generate_sample(model, nfe, output_dir, test_texts, ref_audio, ref_text)
+    # Warmup so torch.compile / allocator costs are not charged to the first NFE value
+    print("\n[Warmup]")
+    warmup(
+        model,
+        ref_file=ref_audio,
+        ref_text=ref_text,
+        gen_text=test_texts[0],
+        show_info=lambda x: None,
+        nfe_step=nfe_values[0],
+    )
+    print("Warmup complete")
+
+    # Generate samples for each NFE value, then wait for the pending writes and
+    # re-raise the first one that failed
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        writes = []
+        for nfe in nfe_values:
+            writes += generate_sample(model, nfe, output_dir, test_texts, ref_audio, ref_text, writer)
+        for write in writes:
+            write.result()
 
     print("\n" + "="*70)
     print("Generation Complete!")
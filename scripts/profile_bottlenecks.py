@@ -11,19 +11,12 @@ Usage:
 
 import argparse
 import json
-import time
-from pathlib import Path
 
 import torch
 import numpy as np
 from torch.profiler import profile, ProfilerActivity, record_function
 
-# Add F5-TTS to path
-import sys
-f5_tts_path = Path(__file__).parent.parent / "third_party" / "F5-TTS" / "src"
-sys.path.insert(0, str(f5_tts_path))
-
-from f5_tts.api import F5TTS
+from _bench_common import bench, load_model
 
 
 def profile_inference(tts_model, text: str, ref_audio: str, ref_text: str, num_runs: int = 5):
@@ -274,19 +267,16 @@ def benchmark_components(tts_model, text: str, ref_audio: str, ref_text: str):
     }
 
     print(f"Running {num_runs} benchmarks...")
-    for i in range(num_runs):
-        start = time.perf_counter()
-
-        _ = tts_model.infer(
-            ref_file=ref_audio,
-            ref_text=ref_text,
-            gen_text=text,
-        )
-
-        end = time.perf_counter()
-        total_time = (end - start) * 1000  # ms
-        times['total'].append(total_time)
+    result = bench(
+        tts_model,
+        n=num_runs,
+        ref_file=ref_audio,
+        ref_text=ref_text,
+        gen_text=text,
+    )
+    times['total'] = [t * 1000 for t in result['times']]  # ms
 
+    for i, total_time in enumerate(times['total']):
         print(f"  Run {i+1}: {total_time:.2f} ms")
 
     print(f"\nResults:")
@@ -294,6 +284,7 @@ def benchmark_components(tts_model, text: str, ref_audio: str, ref_text: str):
     print(f"  Std:  {np.std(times['total']):.2f} ms")
     print(f"  Min:  {np.min(times['total']):.2f} ms")
     print(f"  Max:  {np.max(times['total']):.2f} ms")
+    print(f"  RTF:  {result['rtf']:.3f}")
 
     # Estimate based on previous profiling
     # Model is typically 70-80% of time, vocoder 15-25%
@@ -331,12 +322,7 @@ def main():
 
     # Initialize model
     print("\nInitializing F5-TTS model...")
-    model = F5TTS(
-        model="F5TTS_v1_Base",
-        ckpt_file="",
-        vocab_file="",
-        device="cuda",
-    )
+    model = load_model("F5TTS_v1_Base", "cuda")
     print("Model initialized.\n")
 
     # Profile inference
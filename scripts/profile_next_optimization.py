@@ -47,8 +47,8 @@ class PerformanceProfiler:
         load_start = time.time()
 
         try:
-            from f5_tts.api import F5TTS
-            tts = F5TTS(device=self.device)
+            from _bench_common import load_model
+            tts = load_model(device=self.device)
         except Exception as e:
             print(f"[ERROR] Failed to load model: {e}")
             return None
@@ -4,27 +4,99 @@ Model Warmup Script
 Pre-compiles F5-TTS model using torch.compile() to avoid first-run latency
 """
 
+import os
 import sys
 import time
 import argparse
 from pathlib import Path
 
-# Add F5-TTS to path
-sys.path.insert(0, str(Path(__file__).parent.parent / "third_party" / "F5-TTS" / "src"))
-
 try:
+    # _bench_common points Inductor at the shared repo-local cache, so import it first
+    from _bench_common import enable_fast_matmul, load_model, print_system_info, quantize_dit_int8
     import torch
-    from f5_tts.api import F5TTS
 except ImportError as e:
     print(f"Error importing dependencies: {e}")
     print("Make sure you have activated the ishowtts environment")
     sys.exit(1)
 
+enable_fast_matmul()
+
+
+def count_cached_graphs() -> int:
+    """Number of FX graphs in the persistent Inductor cache"""
+    fxgraph_dir = Path(os.environ["TORCHINDUCTOR_CACHE_DIR"]) / "fxgraph"
+    if not fxgraph_dir.exists():
+        return 0
+    return sum(1 for p in fxgraph_dir.rglob("*") if p.is_file())
+
+
+def export_aoti(transformer, example_kwargs: dict, output_path: str) -> bool:
+    """
+    Ahead-of-time compile the DiT forward to a shared library with AOTInductor.
+    The library can be loaded in another process with torch._export.aot_load()
+    without any Dynamo tracing (validate_nfe7.py --aoti, via enable_aoti_dit()).
+
+    The mel sequence and text lengths are exported as dynamic dimensions, so one
+    library serves every utterance length; non-tensor kwargs stay specialized.
+    """
+    print(f"\n[AOTInductor] Exporting DiT to {output_path}...")
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+
+    try:
+        # Captured inputs are inference tensors; export needs regular ones. The text
+        # cache would make the DiT write module attributes while being traced
+        example_kwargs = {k: v.clone() if torch.is_tensor(v) else v for k, v in example_kwargs.items()}
+        if "cache" in example_kwargs:
+            example_kwargs["cache"] = False
+
+        seq_len = torch.export.Dim("seq_len", min=2, max=4096)
+        text_len = torch.export.Dim("text_len", min=2, max=4096)
+        mel_len = example_kwargs["x"].shape[1]
+        dynamic_shapes = {}
+        for name, value in example_kwargs.items():
+            if name == "text":
+                dynamic_shapes[name] = {1: text_len}
+            elif torch.is_tensor(value) and value.ndim >= 2 and value.shape[1] == mel_len:
+                dynamic_shapes[name] = {1: seq_len}
+            else:
+                dynamic_shapes[name] = None
+
+        with torch.no_grad():
+            so_path = torch._export.aot_compile(
+                transformer,
+                (),
+                kwargs=example_kwargs,
+                dynamic_shapes=dynamic_shapes,
+                options={"aot_inductor.output_path": output_path},
+            )
+        export_time = time.perf_counter() - start
+        print(f"✓ Exported in {export_time:.2f}s: {so_path}")
+
+        # Verify the artifact loads and runs on the example inputs
+        runner = torch._export.aot_load(so_path, device="cuda" if torch.cuda.is_available() else "cpu")
+        with torch.no_grad():
+            runner(**example_kwargs)
+        print("✓ AOTInductor artifact loads and runs")
+        return True
+
+    except Exception as e:
+        print(f"✗ AOTInductor export failed: {e}")
+        return False
+
 
-def warmup_model(ref_audio: str, ref_text: str, nfe_steps: int = 16):
+def warmup_model(
+    ref_audio: str,
+    ref_text: str,
+    nfe_steps: int = 16,
+    export_aoti_path: str | None = None,
+    int8: bool = False,
+):
     """
     Warmup the F5-TTS model by running inference once.
-    This triggers torch.compile() JIT compilation if enabled.
+    This triggers torch.compile() JIT compilation if enabled; compiled graphs are
+    written to the shared Inductor cache (.cache/inductor), which later runs of the
+    scripts importing _bench_common reuse instead of recompiling from scratch.
     """
 
     print("=" * 70)
@@ -33,38 +105,63 @@ def warmup_model(ref_audio: str, ref_text: str, nfe_steps: int = 16):
 
     # System info
     print("\n[System Info]")
-    print(f"PyTorch: {torch.__version__}")
-    print(f"CUDA available: {torch.cuda.is_available()}")
-    if torch.cuda.is_available():
-        print(f"CUDA device: {torch.cuda.get_device_name(0)}")
-        print(f"CUDA version: {torch.version.cuda}")
+    print_system_info()
     print(f"torch.compile available: {hasattr(torch, 'compile')}")
+    print(f"Inductor cache: {os.environ['TORCHINDUCTOR_CACHE_DIR']} ({count_cached_graphs()} FX graphs)")
 
     # Initialize model
-    print("\n[Step 1/3] Initializing Model...")
+    print("\n[Step 1/4] Initializing Model...")
     start = time.perf_counter()
-    model = F5TTS(model_type="F5-TTS")
+    model = load_model()
     init_time = time.perf_counter() - start
     print(f"✓ Model loaded in {init_time:.2f}s")
 
+    # Split one-off costs out of the timed warmups: fault in the CUDA context and
+    # caching allocator, then run a tiny inference to trace the graph and let the
+    # cuDNN autotuner (enabled by enable_fast_matmul) pick its algorithms
+    print("\n[Step 2/4] Priming CUDA allocator and tracing pass...")
+    start = time.perf_counter()
+    try:
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+            a = torch.randn(1024, 1024, device="cuda")
+            _ = a @ a
+            torch.cuda.synchronize()
+        with torch.inference_mode():
+            model.infer(
+                ref_file=ref_audio,
+                ref_text=ref_text,
+                gen_text="a",
+                nfe_step=nfe_steps,
+                show_info=lambda x: None,
+            )
+        prime_time = time.perf_counter() - start
+        print(f"✓ Priming completed in {prime_time:.2f}s")
+
+    except Exception as e:
+        print(f"✗ Priming failed: {e}")
+        return False
+
     # First warmup inference (triggers compilation)
-    print("\n[Step 2/3] First Warmup Inference (JIT compilation)...")
+    print("\n[Step 3/4] First Warmup Inference (JIT compilation)...")
     print("⚠ This will take 30-60 seconds due to torch.compile() overhead")
     start = time.perf_counter()
 
     try:
-        wav, sr, _ = model.infer(
-            ref_file=ref_audio,
-            ref_text=ref_text,
-            gen_text="你好，这是模型预热测试。",
-            nfe_step=nfe_steps,
-            show_info=print
-        )
+        with torch.inference_mode():
+            wav, sr, _ = model.infer(
+                ref_file=ref_audio,
+                ref_text=ref_text,
+                gen_text="你好，这是模型预热测试。",
+                nfe_step=nfe_steps,
+                show_info=print
+            )
         first_time = time.perf_counter() - start
         audio_duration = len(wav) / sr
         rtf_first = first_time / audio_duration
 
         print(f"✓ First inference completed in {first_time:.2f}s")
+        print(f"  Inductor cache now holds {count_cached_graphs()} FX graphs")
         print(f"  Audio duration: {audio_duration:.2f}s")
         print(f"  RTF: {rtf_first:.3f}")
 
@@ -72,18 +169,29 @@ def warmup_model(ref_audio: str, ref_text: str, nfe_steps: int = 16):
         print(f"✗ First inference failed: {e}")
         return False
 
+    # Record one DiT call's inputs to use as AOTInductor example inputs
+    transformer = getattr(model.ema_model, "_orig_mod", model.ema_model).transformer
+    example_kwargs = {}
+    hook = None
+    if export_aoti_path:
+        def capture_inputs(module, args, kwargs):
+            if not example_kwargs:
+                example_kwargs.update({k: v.clone() if torch.is_tensor(v) else v for k, v in kwargs.items()})
+        hook = transformer.register_forward_pre_hook(capture_inputs, with_kwargs=True)
+
     # Second warmup inference (should be much faster)
-    print("\n[Step 3/3] Second Warmup Inference (using compiled model)...")
+    print("\n[Step 4/4] Second Warmup Inference (using compiled model)...")
     start = time.perf_counter()
 
     try:
-        wav, sr, _ = model.infer(
-            ref_file=ref_audio,
-            ref_text=ref_text,
-            gen_text="测试编译后的模型性能。",
-            nfe_step=nfe_steps,
-            show_info=print
-        )
+        with torch.inference_mode():
+            wav, sr, _ = model.infer(
+                ref_file=ref_audio,
+                ref_text=ref_text,
+                gen_text="测试编译后的模型性能。",
+                nfe_step=nfe_steps,
+                show_info=print
+            )
         second_time = time.perf_counter() - start
         audio_duration = len(wav) / sr
         rtf_second = second_time / audio_duration
@@ -96,6 +204,42 @@ def warmup_model(ref_audio: str, ref_text: str, nfe_steps: int = 16):
         print(f"✗ Second inference failed: {e}")
         return False
 
+    finally:
+        if hook is not None:
+            hook.remove()
+
+    if export_aoti_path and not export_aoti(transformer, example_kwargs, export_aoti_path):
+        return False
+
+    # Re-run both warmups on the quantized DiT: the first recompiles, the second is timed
+    rtf_int8 = None
+    if int8:
+        print("\n[INT8] Quantizing DiT linear layers (int8 weight-only)...")
+        try:
+            quantize_dit_int8(model)
+        except RuntimeError as e:
+            print(f"✗ {e}")
+            return False
+        print("✓ DiT quantized")
+        try:
+            for gen_text in ("你好，这是模型预热测试。", "测试编译后的模型性能。"):
+                start = time.perf_counter()
+                with torch.inference_mode():
+                    wav, sr, _ = model.infer(
+                        ref_file=ref_audio,
+                        ref_text=ref_text,
+                        gen_text=gen_text,
+                        nfe_step=nfe_steps,
+                        show_info=lambda x: None,
+                    )
+                int8_time = time.perf_counter() - start
+            rtf_int8 = int8_time / (len(wav) / sr)
+            print(f"✓ INT8 inference completed in {int8_time:.2f}s (RTF: {rtf_int8:.3f})")
+
+        except Exception as e:
+            print(f"✗ INT8 inference failed: {e}")
+            return False
+
     # Print summary
     print("\n" + "=" * 70)
     print("WARMUP SUMMARY")
@@ -103,9 +247,12 @@ def warmup_model(ref_audio: str, ref_text: str, nfe_steps: int = 16):
 
     speedup = first_time / second_time if second_time > 0 else 0
     print(f"\n  Model initialization: {init_time:.2f}s")
+    print(f"  Allocator + tracing pass: {prime_time:.2f}s")
     print(f"  First inference (with compilation): {first_time:.2f}s (RTF: {rtf_first:.3f})")
     print(f"  Second inference (compiled): {second_time:.2f}s (RTF: {rtf_second:.3f})")
     print(f"  Speedup after compilation: {speedup:.2f}x")
+    if rtf_int8 is not None:
+        print(f"  INT8 weight-only (compiled): RTF {rtf_second:.3f} -> {rtf_int8:.3f} ({rtf_second / rtf_int8:.2f}x)")
 
     if rtf_second < 0.3:
         print(f"\n  ✓ Excellent! RTF < 0.3 (target achieved)")
@@ -133,6 +280,19 @@ def main():
     parser.add_argument("--ref-audio", required=True, help="Reference audio file path")
     parser.add_argument("--ref-text", required=True, help="Reference audio transcript")
     parser.add_argument("--nfe-steps", type=int, default=16, help="NFE steps (default: 16)")
+    parser.add_argument(
+        "--export-aoti",
+        nargs="?",
+        const="models/dit_aoti.so",
+        default=None,
+        help="Also export the DiT with AOTInductor (default path: models/dit_aoti.so)",
+    )
+
+    parser.add_argument(
+        "--int8",
+        action="store_true",
+        help="After the FP16 warmups, quantize the DiT to int8 weight-only (torchao) and compare RTF",
+    )
 
     args = parser.parse_args()
 
@@ -142,7 +302,7 @@ def main():
         sys.exit(1)
 
     # Run warmup
-    success = warmup_model(args.ref_audio, args.ref_text, args.nfe_steps)
+    success = warmup_model(args.ref_audio, args.ref_text, args.nfe_steps, args.export_aoti, args.int8)
     sys.exit(0 if success else 1)
 
 